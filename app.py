@@ -1,51 +1,121 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Query
+from fastapi import FastAPI, WebSocket, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field
-from typing import Any, Dict, List, Optional
+from typing import Any, Deque, Dict, List, Set
 import uvicorn
-import json
-from datetime import datetime
-
-app = FastAPI(title="Robot Event API", version="2.2.0")
+import asyncio
+import os
+import orjson
+from collections import deque
+from datetime import datetime, timezone
+from itertools import islice
+
+app = FastAPI(
+    title="Robot Event API",
+    version="2.2.0",
+    default_response_class=ORJSONResponse,
+)
 
 # -----------------------------
 # CORS
+# CORS_ORIGINS: comma-separated allowed origins (default "*").
+# Set it to an empty string to skip the middleware for
+# non-browser clients.
 # -----------------------------
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+CORS_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv("CORS_ORIGINS", "*").split(",")
+    if origin.strip()
+]
+
+if CORS_ORIGINS:
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=CORS_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
 
 # -----------------------------
 # In-memory event store
-# robot_id -> list of events
+# robot_id -> most recent events (bounded)
+# robot_id -> event_name -> most recent events of that name
+# The index only ever holds events still in EVENT_STORE, so
+# MAX_EVENTS_PER_ROBOT bounds both.
 # -----------------------------
-EVENT_STORE: Dict[str, List[Dict[str, Any]]] = {}
+MAX_EVENTS_PER_ROBOT = 10_000
+MAX_QUERY_LIMIT = 100
+
+EVENT_STORE: Dict[str, Deque[Dict[str, Any]]] = {}
+EVENT_INDEX: Dict[str, Dict[str, Deque[Dict[str, Any]]]] = {}
 
 # -----------------------------
 # WebSocket Manager
+# Each client gets an outgoing queue drained by its own writer task, so a
+# broadcast only enqueues. A client more than SEND_QUEUE_SIZE frames behind
+# is closed with 1013 (try again later) so it can reconnect.
 # -----------------------------
+SEND_QUEUE_SIZE = 100
+
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        # websocket -> queue of text frames, or an int close code to stop
+        self.active_connections: Dict[WebSocket, asyncio.Queue] = {}
+        # keeps writer tasks referenced until they finish
+        self.writers: Set[asyncio.Task] = set()
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        queue = asyncio.Queue()
+        self.active_connections[websocket] = queue
 
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        task = asyncio.create_task(self.send_loop(websocket, queue))
+        self.writers.add(task)
+        task.add_done_callback(self.writers.discard)
 
-    async def broadcast(self, message: dict):
-        for ws in self.active_connections:
+    def disconnect(self, websocket: WebSocket, code: int = 1000):
+        queue = self.active_connections.pop(websocket, None)
+        if queue is not None:
+            # the writer finishes its current frame, then closes the socket
+            queue.put_nowait(code)
+
+    async def send_loop(self, websocket: WebSocket, queue: asyncio.Queue):
+        while True:
+            item = await queue.get()
+            if isinstance(item, int):
+                code = item
+                break
             try:
-                await ws.send_json(message)
-            except:
-                pass
+                await websocket.send_text(item)
+            except Exception:
+                # broken socket: stop sending to it
+                self.active_connections.pop(websocket, None)
+                code = 1011
+                break
+
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            # already closed by the client
+            pass
+
+    async def broadcast(self, message: dict):
+        # serialize once for all clients; send_json would json.dumps per socket.
+        # Sent as a text frame so clients see the same frames as before.
+        payload = orjson.dumps(message).decode()
+
+        # snapshot, since slow clients are removed while iterating
+        for ws, queue in list(self.active_connections.items()):
+            if queue.qsize() >= SEND_QUEUE_SIZE:
+                # too far behind: drop its backlog and close it
+                while not queue.empty():
+                    queue.get_nowait()
+                self.disconnect(ws, code=1013)
+            else:
+                queue.put_nowait(payload)
 
 
 manager = ConnectionManager()
@@ -60,11 +130,6 @@ class EventRequest(BaseModel):
         extra = "allow"
 
 
-class EventPayload(BaseModel):
-    class Config:
-        extra = "allow"
-
-
 class EventResponse(BaseModel):
     status: str
     event: str
@@ -77,76 +142,170 @@ class EventResponse(BaseModel):
 # Helpers
 # -----------------------------
 def store_event(robot_id: str, event_name: str, data: Dict[str, Any], timestamp: str):
-    EVENT_STORE.setdefault(robot_id, []).append({
+    event = {
         "event": event_name,
         "data": data,
         "timestamp": timestamp
-    })
+    }
+    # get-then-create rather than setdefault, which would build a throwaway
+    # default container on every call
+    events = EVENT_STORE.get(robot_id)
+    if events is None:
+        events = EVENT_STORE[robot_id] = deque(maxlen=MAX_EVENTS_PER_ROBOT)
+    index = EVENT_INDEX.get(robot_id)
+    if index is None:
+        index = EVENT_INDEX[robot_id] = {}
+
+    if len(events) == MAX_EVENTS_PER_ROBOT:
+        # the oldest event is about to be evicted; eviction is FIFO, so if it
+        # is still indexed it is the oldest entry under its name
+        evicted = events[0]
+        named = index[evicted["event"]]
+        if named and named[0] is evicted:
+            named.popleft()
+        if not named:
+            del index[evicted["event"]]
+
+    events.append(event)
+    named = index.get(event_name)
+    if named is None:
+        # reads never ask for more than MAX_QUERY_LIMIT events per name
+        named = index[event_name] = deque(maxlen=MAX_QUERY_LIMIT)
+    named.append(event)
+
+
+def parse_event_body(body: bytes) -> Dict[str, Any]:
+    # mirrors the 422 errors FastAPI raised for the former EventPayload body.
+    # Note: orjson reads integers wider than 64 bits as floats, so such
+    # values are stored and echoed back as floats.
+    if not body:
+        raise RequestValidationError([{
+            "type": "missing",
+            "loc": ("body",),
+            "msg": "Field required",
+            "input": None,
+        }])
+
+    try:
+        data = orjson.loads(body)
+    except orjson.JSONDecodeError as e:
+        raise RequestValidationError([{
+            "type": "json_invalid",
+            "loc": ("body", e.pos),
+            "msg": "JSON decode error",
+            "input": {},
+            "ctx": {"error": e.msg},
+        }], body=e.doc)
+
+    if not isinstance(data, dict):
+        raise RequestValidationError([{
+            "type": "model_attributes_type",
+            "loc": ("body",),
+            "msg": "Input should be a valid dictionary or object to extract fields from",
+            "input": data,
+        }], body=data)
+
+    return data
+
+
+def utc_now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def latest_events(events: Deque[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+    # last `limit` events in insertion order, without copying the whole deque
+    tail = list(islice(reversed(events), limit))
+    tail.reverse()
+    return tail
 
 
 # -----------------------------
 # Root
 # -----------------------------
+# constant body, serialized once at import
+ROOT_BODY = orjson.dumps({
+    "name": "Robot Event API",
+    "version": "2.2.0",
+    "endpoints": [
+        "POST /event/{robot_id}/{event_name}",
+        "GET /event/{robot_id}",
+        "GET /event/{robot_id}/{event_name}",
+        "WebSocket /ws"
+    ]
+})
+
+
 @app.get("/")
 async def root():
-    return {
-        "name": "Robot Event API",
-        "version": "2.2.0",
-        "endpoints": [
-            "POST /event/{robot_id}/{event_name}",
-            "GET /event/{robot_id}",
-            "GET /event/{robot_id}/{event_name}",
-            "WebSocket /ws"
-        ]
-    }
+    return Response(content=ROOT_BODY, media_type="application/json")
 
 
 # -----------------------------
 # GET robot events
+# Returned as ORJSONResponse directly so FastAPI skips jsonable_encoder
+# over the event list.
 # -----------------------------
 @app.get("/event/{robot_id}")
 async def get_robot_events(
     robot_id: str,
-    limit: int = Query(20, ge=1, le=100)
+    limit: int = Query(20, ge=1, le=MAX_QUERY_LIMIT)
 ):
-    events = EVENT_STORE.get(robot_id, [])[-limit:]
-    return {
+    events = latest_events(EVENT_STORE.get(robot_id, ()), limit)
+    return ORJSONResponse({
         "robot": robot_id,
         "events": events,
         "count": len(events)
-    }
+    })
 
 
 @app.get("/event/{robot_id}/{event_name}")
 async def get_robot_event_by_name(
     robot_id: str,
     event_name: str,
-    limit: int = Query(20, ge=1, le=100)
+    limit: int = Query(20, ge=1, le=MAX_QUERY_LIMIT)
 ):
-    events = [
-        e for e in EVENT_STORE.get(robot_id, [])
-        if e["event"] == event_name
-    ][-limit:]
+    events = latest_events(EVENT_INDEX.get(robot_id, {}).get(event_name, ()), limit)
 
-    return {
+    return ORJSONResponse({
         "robot": robot_id,
         "event": event_name,
         "events": events,
         "count": len(events)
-    }
+    })
 
 
 # -----------------------------
 # POST robot event
 # -----------------------------
-@app.post("/event/{robot_id}/{event_name}", response_model=EventResponse)
+# The body is read and decoded by hand so no Pydantic model is built or
+# validated on the way in or out; EventResponse and openapi_extra only
+# document the schema.
+@app.post(
+    "/event/{robot_id}/{event_name}",
+    responses={200: {"model": EventResponse}},
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {
+                        "title": "EventPayload",
+                        "type": "object",
+                        "additionalProperties": True,
+                    }
+                }
+            },
+        }
+    }
+)
 async def post_robot_event(
     robot_id: str,
     event_name: str,
-    payload: EventPayload
+    request: Request
 ):
-    timestamp = datetime.utcnow().isoformat()
-    data = payload.model_dump()
+    data = parse_event_body(await request.body())
+
+    timestamp = utc_now_iso()
 
     store_event(robot_id, event_name, data, timestamp)
 
@@ -158,13 +317,13 @@ async def post_robot_event(
         "timestamp": timestamp
     })
 
-    return EventResponse(
-        status="success",
-        event=event_name,
-        message=f"Robot {robot_id}: event received",
-        data={"robot": robot_id, **data} if data else {"robot": robot_id},
-        timestamp=timestamp
-    )
+    return ORJSONResponse({
+        "status": "success",
+        "event": event_name,
+        "message": f"Robot {robot_id}: event received",
+        "data": {"robot": robot_id, **data},
+        "timestamp": timestamp
+    })
 
 
 # -----------------------------
@@ -176,27 +335,49 @@ async def websocket_endpoint(websocket: WebSocket):
 
     try:
         while True:
-            await websocket.receive_text()
-    except WebSocketDisconnect:
+            # incoming frames are ignored, so read the raw ASGI message:
+            # nothing gets decoded and binary frames are drained too
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+    finally:
         manager.disconnect(websocket)
 
 
 # -----------------------------
 # Health
 # -----------------------------
+# only the two counters change, so fill them into a fixed template
+HEALTH_TEMPLATE = b'{"status":"ok","robots":%d,"connections":%d}'
+
+
 @app.get("/health")
 async def health():
-    return {
-        "status": "ok",
-        "robots": len(EVENT_STORE),
-        "connections": len(manager.active_connections)
-    }
+    return Response(
+        content=HEALTH_TEMPLATE % (len(EVENT_STORE), len(manager.active_connections)),
+        media_type="application/json"
+    )
 
 
 # -----------------------------
 # Run
 # -----------------------------
 if __name__ == "__main__":
-    import os
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run("app:app", host="0.0.0.0", port=port)
+
+    # EVENT_STORE and the websocket manager live in process memory, so each
+    # worker has its own copy: only raise this once events and broadcasts
+    # are shared across workers (e.g. via Redis pub/sub)
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
+
+    # loop/http/ws are left on "auto": uvicorn[standard] provides uvloop,
+    # httptools and websockets, and uvicorn falls back to asyncio, h11 and
+    # wsproto where they are unavailable (e.g. uvloop on Windows)
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=port,
+        # broadcast frames are small JSON; deflate costs more CPU than it saves
+        ws_per_message_deflate=False,
+        workers=workers,
+    )
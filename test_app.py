@@ -0,0 +1,107 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import app as app_module
+from app import app, EVENT_STORE, EVENT_INDEX
+
+
+@pytest.fixture
+def client():
+    EVENT_STORE.clear()
+    EVENT_INDEX.clear()
+    with TestClient(app) as client:
+        yield client
+    EVENT_STORE.clear()
+    EVENT_INDEX.clear()
+
+
+# -----------------------------
+# Event store eviction
+# -----------------------------
+def test_eviction_keeps_index_in_sync(client, monkeypatch):
+    monkeypatch.setattr(app_module, "MAX_EVENTS_PER_ROBOT", 3)
+
+    for i in range(10):
+        client.post(f"/event/r1/name{i}", json={"i": i})
+
+    events = client.get("/event/r1").json()["events"]
+    assert [e["event"] for e in events] == ["name7", "name8", "name9"]
+
+    # names whose last event was evicted are dropped from the index
+    assert set(EVENT_INDEX["r1"]) == {"name7", "name8", "name9"}
+    assert client.get("/event/r1/name0").json()["count"] == 0
+    assert client.get("/event/r1/name9").json()["count"] == 1
+
+
+def test_eviction_only_trims_oldest_of_name(client, monkeypatch):
+    monkeypatch.setattr(app_module, "MAX_EVENTS_PER_ROBOT", 4)
+
+    for name in ["a", "b", "a", "b", "a", "a"]:
+        client.post(f"/event/r1/{name}", json={})
+
+    # store now holds a, b, a, a
+    store = list(EVENT_STORE["r1"])
+    assert [e["event"] for e in store] == ["a", "b", "a", "a"]
+
+    for name in ["a", "b"]:
+        indexed = list(EVENT_INDEX["r1"][name])
+        assert indexed == [e for e in store if e["event"] == name]
+
+
+# -----------------------------
+# POST body errors
+# -----------------------------
+def post_raw(client, body: bytes):
+    return client.post(
+        "/event/r1/ping",
+        content=body,
+        headers={"Content-Type": "application/json"}
+    )
+
+
+def test_missing_body(client):
+    response = post_raw(client, b"")
+
+    assert response.status_code == 422
+    assert response.json()["detail"] == [{
+        "type": "missing",
+        "loc": ["body"],
+        "msg": "Field required",
+        "input": None,
+    }]
+
+
+@pytest.mark.parametrize("body", [
+    b'{"a":',
+    b'{"a": NaN}',
+    b'{"s": "\xff"}',
+])
+def test_invalid_json_body(client, body):
+    response = post_raw(client, body)
+
+    assert response.status_code == 422
+    [error] = response.json()["detail"]
+    assert error["type"] == "json_invalid"
+    assert error["loc"][0] == "body"
+    assert error["msg"] == "JSON decode error"
+    assert "r1" not in EVENT_STORE
+
+
+def test_non_object_body(client):
+    response = post_raw(client, b"[1, 2]")
+
+    assert response.status_code == 422
+    assert response.json()["detail"] == [{
+        "type": "model_attributes_type",
+        "loc": ["body"],
+        "msg": "Input should be a valid dictionary or object to extract fields from",
+        "input": [1, 2],
+    }]
+
+
+def test_wide_integer_is_stored_and_served(client):
+    response = post_raw(client, b'{"n": 123456789012345678901234}')
+
+    assert response.status_code == 200
+    assert client.get("/event/r1").status_code == 200
+    assert client.get("/event/r1/ping").status_code == 200